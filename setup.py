@@ -42,4 +42,5 @@ setup(
         "Programming Language :: Python :: 3.10",
     ],
     install_requires=["sphinx>=1.8"],
+    extras_require={"pygit2": ["pygit2"]},
 )
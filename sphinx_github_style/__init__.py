@@ -1,17 +1,26 @@
 from __future__ import annotations
+import os
+import ast
 import sys
 import sphinx
 import inspect
 import subprocess
 from pathlib import Path
-from functools import cached_property
+from operator import attrgetter
+from functools import cached_property, lru_cache, partial
 from sphinx.application import Sphinx
 from sphinx.errors import ExtensionError, SphinxError
-from typing import Dict, Any, Optional, Callable, TYPE_CHECKING
+from sphinx.util import logging
+from typing import Dict, Any, List, Optional, Callable, Tuple, TYPE_CHECKING
 from docutils import nodes
 from sphinx import addnodes
 from sphinx.locale import _
 
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
 
 if TYPE_CHECKING:
     from docutils.nodes import Node
@@ -21,14 +30,27 @@ if TYPE_CHECKING:
 __version__ = "1.2.0"
 __author__ = 'Adam Korn <hello@dailykitten.net>'
 
+_STATIC_DIR = str(Path(__file__).parent.joinpath("_static").resolve())
+
 from .add_linkcode_class import add_linkcode_node_class
 from .github_style import GitHubStyle
 from .lexer import GitHubLexer
 
+logger = logging.getLogger(__name__)
+
+
 class LinkcodeError(SphinxError):
     category = "linkcode error"
 
 
+DOMAIN_KEYS = {
+    'py': ['module', 'fullname'],
+    'c': ['names'],
+    'cpp': ['names'],
+    'js': ['object', 'fullname'],
+}
+
+
 def doctree_read(app: Sphinx, doctree: Node) -> None:
     env = app.builder.env
 
@@ -38,29 +60,24 @@ def doctree_read(app: Sphinx, doctree: Node) -> None:
         raise LinkcodeError(msg)
     assert resolve_target is not None  # for mypy
 
-    domain_keys = {
-        'py': ['module', 'fullname'],
-        'c': ['names'],
-        'cpp': ['names'],
-        'js': ['object', 'fullname'],
-    }
+    # Translated once; each link gets its own copy of the node
+    inline_template = nodes.inline('', _('[source]'), classes=['viewcode-link'])
 
-    for objnode in list(doctree.findall(addnodes.desc)):
+    for objnode in doctree.findall(addnodes.desc):
         domain = objnode.get('domain')
-        uris: set[str] = set()
-        for signode in objnode:
-            if not isinstance(signode, addnodes.desc_signature):
-                continue
+        keys = DOMAIN_KEYS.get(domain)
+        if not keys:
+            # unsupported domain, nothing to pass to linkcode_resolve
+            continue
 
+        uris: set[str] = set()
+        signodes = [c for c in objnode.children if isinstance(c, addnodes.desc_signature)]
+        for signode in signodes:
             # Convert signode to a specified format
-            info = {}
-            for key in domain_keys.get(domain, []):
-                value = signode.get(key)
-                if not value:
-                    value = ''
-                info[key] = value
-            if not info:
-                continue
+            if domain == 'py':
+                info = {'module': signode.get('module') or '', 'fullname': signode.get('fullname') or ''}
+            else:
+                info = {key: signode.get(key) or '' for key in keys}
 
             # Call user code to resolve the link
             uri = resolve_target(domain, info)
@@ -68,12 +85,12 @@ def doctree_read(app: Sphinx, doctree: Node) -> None:
                 # no source
                 continue
 
-            if uri in uris or not uri:
+            if uri in uris:
                 # only one link per name, please
                 continue
             uris.add(uri)
 
-            inline = nodes.inline('', _('[source]'), classes=['viewcode-link'])
+            inline = inline_template.deepcopy()
             # this does not work for markdown builder
             # onlynode = addnodes.only(expr='html')
             # onlynode += nodes.reference('', '', inline, internal=False, refuri=uri)
@@ -92,14 +109,13 @@ def setup(app: Sphinx) -> Dict[str, Any]:
         context=get_conf_val(app, 'html_context'),
     )
     linkcode_func = get_conf_val(app, "linkcode_resolve")
-    repo_dir = get_repo_dir()
 
     if not callable(linkcode_func):
-        print(
+        logger.debug(
             "Function `linkcode_resolve` not found in ``conf.py``; "
             "using default function from ``sphinx_github_style``"
         )
-        linkcode_func = get_linkcode_resolve(linkcode_url, repo_dir)
+        linkcode_func = get_linkcode_resolve(linkcode_url, get_repo_dir())
         set_conf_val(app, 'linkcode_resolve', linkcode_func)
 
     app.setup_extension('sphinx_github_style.add_linkcode_class')
@@ -115,11 +131,10 @@ def setup(app: Sphinx) -> Dict[str, Any]:
 
 def add_static_path(app) -> None:
     """Add the path for the ``_static`` folder"""
-    app.config.html_static_path.append(
-        str(Path(__file__).parent.joinpath("_static").absolute())
-    )
+    app.config.html_static_path.append(_STATIC_DIR)
 
 
+@lru_cache(maxsize=8)
 def get_linkcode_revision(blob: str) -> str:
     """Get the blob to link to on GitHub
 
@@ -139,38 +154,66 @@ def get_linkcode_revision(blob: str) -> str:
     return blob
 
 
+@lru_cache(maxsize=1)
 def get_head() -> str:
     """Gets the most recent commit hash or tag
 
     :return: The SHA or tag name of the most recent commit, or "master" if the call to git fails.
     """
-    cmd = "git log -n1 --pretty=%H"
-    try:
-        # get most recent commit hash
-        head = subprocess.check_output(cmd.split()).strip().decode('utf-8')
-
-        # if head is a tag, use tag as reference
-        cmd = "git describe --exact-match --tags " + head
+    repo = _get_repository()
+    if repo is not None and not repo.head_is_unborn:
         try:
-            tag = subprocess.check_output(cmd.split(" ")).strip().decode('utf-8')
-            return tag
+            commit = repo.head.peel(pygit2.Commit)
+        except (pygit2.GitError, ValueError):
+            pass  # fall back to the git executable
+        else:
+            # if head is a tag, use tag as reference
+            # (describe the commit, not the workdir, which would scan the whole working tree)
+            try:
+                return repo.describe(
+                    committish=commit, describe_strategy=pygit2.GIT_DESCRIBE_TAGS, max_candidates_tags=0
+                )
+            except (pygit2.GitError, KeyError):
+                return str(commit.id)
 
-        except subprocess.CalledProcessError:
-            return head
+    try:
+        # get most recent commit hash and the refs pointing to it
+        # (decoration flags override the user's log.decorate/log.excludeDecoration config)
+        head, _, refs = _run_git(
+            "log", "-n1", "--no-show-signature", "--decorate=short", "--decorate-refs=refs/tags/", "--pretty=%H%n%D"
+        ).partition("\n")
 
     except subprocess.CalledProcessError:
-        print("Failed to get head")  # so no head?
+        logger.debug("Failed to get head")  # so no head?
         return "master"
 
+    # if head is a tag, use tag as reference
+    for ref in refs.strip().split(", "):
+        if ref.startswith("tag: "):
+            return ref[len("tag: "):]
+
+    return head.strip()
+
 
+@lru_cache(maxsize=1)
 def get_last_tag() -> str:
     """Get the most recent commit tag on the currently checked out branch
 
     :raises ExtensionError: if no tags exist on the branch
     """
+    repo = _get_repository()
+    if repo is not None and not repo.head_is_unborn:
+        try:
+            commit = repo.head.peel(pygit2.Commit)
+            return repo.describe(
+                committish=commit, describe_strategy=pygit2.GIT_DESCRIBE_TAGS, abbreviated_size=0
+            )
+
+        except (pygit2.GitError, KeyError, ValueError):
+            pass  # fall back to the git executable
+
     try:
-        cmd = "git describe --tags --abbrev=0"
-        return subprocess.check_output(cmd.split(" ")).strip().decode('utf-8')
+        return _run_git("describe", "--tags", "--abbrev=0").strip()
 
     except subprocess.CalledProcessError:
         raise ExtensionError("``sphinx-github-style``: no tags found on current branch")
@@ -190,7 +233,7 @@ def get_linkcode_url(blob: Optional[str] = None, context: Optional[Dict] = None,
             raise ExtensionError(
                 "sphinx-github-style: config value ``linkcode_url`` is missing")
         else:
-            print(
+            logger.debug(
                 "sphinx-github-style: config value ``linkcode_url`` is missing. "
                 "Creating link from ``html_context`` values..."
             )
@@ -218,6 +261,9 @@ def get_linkcode_resolve(linkcode_url: str, repo_dir: Optional[Path] = None) ->
     if repo_dir is None:
         repo_dir = get_repo_dir()
 
+    # Source file path -> {qualname: [(linestart, linestop), ...]}, parsed once per file
+    source_spans: Dict[str, Dict[str, List[Tuple[int, int]]]] = {}
+
     def linkcode_resolve(domain, info):
         """Returns a link to the source code on GitHub, with appropriate lines highlighted
 
@@ -236,32 +282,58 @@ def get_linkcode_resolve(linkcode_url: str, repo_dir: Optional[Path] = None) ->
         if submod is None:
             return None
 
-        obj = submod
-        for part in fullname.split('.'):
-            try:
-                obj = getattr(obj, part)
-            except AttributeError:
-                return None
+        try:
+            if '.' in fullname:
+                obj = attrgetter(fullname)(submod)
+            else:  # module-level object
+                obj = getattr(submod, fullname)
+        except AttributeError:
+            return None
 
-        if isinstance(obj, property):
-            obj = obj.fget
-        elif isinstance(obj, cached_property):
-            obj = obj.func
+        try:
+            # Link to the decorated function, not the wrapper
+            obj = inspect.unwrap(obj)
+
+            if isinstance(obj, property):
+                obj = inspect.unwrap(obj.fget)
+            elif isinstance(obj, (cached_property, partial)):
+                obj = inspect.unwrap(obj.func)
+        except Exception:
+            # ex. autodoc mock objects, which make unwrap() loop forever
+            return None
 
         try:
-            modpath = inspect.getsourcefile(inspect.unwrap(obj))
+            modpath = inspect.getsourcefile(obj)
             filepath = Path(modpath).relative_to(repo_dir)
             if filepath is None:
                 return
         except Exception:
             return None
 
-        try:
-            source, lineno = inspect.getsourcelines(obj)
-        except Exception:
-            return None
+        spans = source_spans.get(modpath)
+        if spans is None:
+            spans = source_spans[modpath] = get_source_spans(modpath)
+
+        candidates = spans.get(getattr(obj, '__qualname__', None), [])
+        code = getattr(obj, '__code__', None)
 
-        linestart, linestop = lineno, lineno + len(source) - 1
+        if code is not None:
+            # Functions know where they start; only the end needs looking up
+            linestart = code.co_firstlineno
+            # None if no definition starts there, ex. a lambda
+            linestop = next((stop for start, stop in candidates if start == linestart), None)
+        elif candidates:
+            linestart, linestop = candidates[0]
+        else:
+            linestop = None
+
+        if linestop is None:
+            try:
+                source, lineno = inspect.getsourcelines(obj)
+            except Exception:
+                return None
+
+            linestart, linestop = lineno, lineno + len(source) - 1
 
         # Example: https://github.com/TDKorn/my-magento/blob/docs/magento/models/model.py#L28-L59
         final_link = linkcode_url.format(
@@ -269,21 +341,70 @@ def get_linkcode_resolve(linkcode_url: str, repo_dir: Optional[Path] = None) ->
             linestart=linestart,
             linestop=linestop
         )
-        print(f"Final Link for {fullname}: {final_link}")
+        logger.debug("Final Link for %s: %s", fullname, final_link)
         return final_link
 
     return linkcode_resolve
 
 
+def get_source_spans(modpath: str) -> Dict[str, List[Tuple[int, int]]]:
+    """Maps the qualified name of every class and function in a source file to its line numbers
+
+    The file is parsed once with :mod:`ast`, so the span of each object can be looked up
+    without :func:`inspect.getsourcelines` re-reading the source for every cross-reference
+
+    .. note:: Spans end at the last line of code, so unlike :func:`inspect.getsourcelines`,
+       they don't include comments trailing the body of a class or function
+
+    :param modpath: The path to the source file
+    :return: A dictionary of ``{qualname: [(linestart, linestop), ...]}``, with one span per
+        definition in source order (ex. a property's getter and setter); empty if the file can't be parsed
+    """
+    try:
+        tree = ast.parse(Path(modpath).read_bytes())
+    except (OSError, SyntaxError, ValueError):
+        return {}
+
+    spans = {}
+    defs = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+
+    def visit(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, defs):
+                visit(child, prefix)
+                continue
+
+            qualname = prefix + child.name
+            # Decorators are included, same as with inspect.getsourcelines()
+            linestart = min([child.lineno] + [d.lineno for d in child.decorator_list])
+            spans.setdefault(qualname, []).append((linestart, child.end_lineno))
+
+            if isinstance(child, ast.ClassDef):
+                visit(child, qualname + '.')
+            else:
+                visit(child, qualname + '.<locals>.')
+
+    visit(tree, '')
+    return spans
+
+
 # EXAMPLE START
+@lru_cache(maxsize=1)
 def get_repo_dir() -> Path:
     """Returns the root directory of the repository
 
     :return: A Path object representing the working directory of the repository.
     """
+    repo = _get_repository()
+    if repo is not None and repo.workdir:
+        return Path(repo.workdir).resolve()
+
+    repo_dir = _find_repo_dir()
+    if repo_dir is not None:
+        return repo_dir
+
     try:
-        cmd = "git rev-parse --show-toplevel"
-        repo_dir = Path(subprocess.check_output(cmd.split(" ")).strip().decode('utf-8'))
+        repo_dir = Path(_run_git("rev-parse", "--show-toplevel").strip())
 
     except subprocess.CalledProcessError as e:
         raise RuntimeError("Unable to determine the repository directory") from e
@@ -292,13 +413,75 @@ def get_repo_dir() -> Path:
 # EXAMPLE END
 
 
+@lru_cache(maxsize=1)
+def _get_repository() -> Optional[pygit2.Repository]:
+    """Opens the repository in the current directory with :mod:`pygit2`, if it's installed
+
+    Reading the repository in-process is much faster than spawning ``git``
+
+    :return: The repository, or ``None`` if ``pygit2`` isn't installed or no repository was found
+    """
+    if pygit2 is None:
+        return None
+
+    path = pygit2.discover_repository(str(Path.cwd()))
+    if path is None:
+        return None
+
+    try:
+        return pygit2.Repository(path)
+    except pygit2.GitError:
+        return None
+
+
+def _find_repo_dir() -> Optional[Path]:
+    """Finds the root of the working tree containing the current directory without running ``git``
+
+    This spares ``"head"`` builds a second git process next to the one made by :func:`~.get_head`
+
+    :return: The closest parent directory containing a ``.git`` entry, or ``None`` if there
+        isn't one or if the ``GIT_DIR``/``GIT_WORK_TREE`` environment variables are set
+    """
+    if "GIT_DIR" in os.environ or "GIT_WORK_TREE" in os.environ:
+        return None
+
+    cwd = Path.cwd().resolve()
+    for path in (cwd, *cwd.parents):
+        # .git is a directory, or a file for worktrees and submodules
+        if path.joinpath(".git").exists():
+            return path
+    return None
+
+
+def _run_git(*args: str) -> str:
+    """Runs a git command and returns its output
+
+    The arguments are passed straight to ``git`` without a shell; ``stdin`` and ``stderr``
+    are discarded so that git can't block on a prompt or print to the console
+
+    :raises subprocess.CalledProcessError: if the git command fails
+    """
+    return subprocess.check_output(
+        ["git", *args],
+        stdin=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        encoding="utf-8",
+    )
+
+
+_MISSING = object()
+
+
 def get_conf_val(app: Sphinx, attr: str, default: Optional[Any] = None) -> Any:
     """Retrieve the value of a ``conf.py`` config variable
 
     :param attr: the config variable to retrieve
     :param default: the default value to return if the variable isn't found
     """
-    return app.config._raw_config.get(attr, getattr(app.config, attr, default))
+    value = app.config._raw_config.get(attr, _MISSING)
+    if value is _MISSING:
+        value = getattr(app.config, attr, default)
+    return value
 
 
 def set_conf_val(app: Sphinx, attr: str, value: Any) -> None:
@@ -1,23 +1,27 @@
 import builtins
-from typing import Set, Dict
+from typing import FrozenSet, Dict
 from pygments.token import Name, Keyword
 from pygments.lexers.python import PythonLexer
-from inspect import getmembers, isclass, isbuiltin, ismethoddescriptor
+from inspect import isclass, isbuiltin, ismethoddescriptor
 
 
-def get_builtins() -> Dict[str, Set]:
+def get_builtins() -> Dict[str, FrozenSet[str]]:
     """Returns a dictionary containing names of built-in functions, classes, and methods"""
-    funcs_meths = set(dict(getmembers(builtins, isbuiltin)))
+    # Scan __dict__ directly; getmembers() calls getattr() on every name
+    members = vars(builtins)
+    funcs_meths = {name for name, obj in members.items() if isbuiltin(obj)}
     classes = set()
 
-    for class_name, _class in getmembers(builtins, isclass):
-        methods = getmembers(_class, ismethoddescriptor)
-        funcs_meths.update(dict(methods))
+    for class_name, _class in members.items():
+        if not isclass(_class):
+            continue
+        # Inherited methods are picked up from the builtin base classes
+        funcs_meths.update(name for name, obj in vars(_class).items() if ismethoddescriptor(obj))
         classes.add(class_name)
 
     return {
-        'funcs': funcs_meths,
-        'classes': classes
+        'funcs': frozenset(funcs_meths),
+        'classes': frozenset(classes)
     }
 
 
@@ -31,13 +35,15 @@ class GitHubLexer(PythonLexer):
     url = 'https://github.com/TDKorn'
     aliases = ['tdk']
 
+    BUILTIN_CLASSES = BUILTINS['classes']
+
     def get_tokens_unprocessed(self, text):
         """Override to add better syntax highlighting"""
         tokens = list(PythonLexer.get_tokens_unprocessed(self, text))
 
         for token_idx, (index, token, value) in enumerate(tokens):
             # Highlight builtins as either function calls or type hints
-            if token is Name.Builtin and value in BUILTINS['classes']:
+            if token is Name.Builtin and value in self.BUILTIN_CLASSES:
                 if tokens[token_idx+1][-1] == '(':
                     yield index, Name.Builtin, value
                 else: